@@ -2,8 +2,12 @@ import sqlite3
 from datetime import datetime, date
 import typer
 import enum
-import rich
 import os
+import re
+import atexit
+import csv
+import functools
+from contextlib import contextmanager
 from pathlib import Path
 
 class Medium(str, enum.Enum):
@@ -25,51 +29,273 @@ past_tense = {
 
 DB_NAME = Path(__file__).resolve().parent / "friends.db"
 
-def get_db():
-    db = sqlite3.connect(DB_NAME)
-    db.execute("PRAGMA foreign_keys = ON;")
-    db.row_factory = sqlite3.Row 
+PRAGMAS = """
+    PRAGMA foreign_keys = ON;
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -64000;
+    PRAGMA mmap_size = 268435456;
+"""
+
+@functools.lru_cache(maxsize=1)
+def _open():
+    # One connection per process, upgraded to the current schema the first time a command needs it.
+    # Transactions are managed explicitly via transaction()
+    db = sqlite3.connect(DB_NAME, isolation_level=None)
+    db.executescript(PRAGMAS)
+    db.row_factory = sqlite3.Row
+    try:
+        init_db(db)
+    except BaseException:
+        # lru_cache does not keep a failed result, so the next call opens a fresh connection
+        db.close()
+        raise
+    atexit.register(db.close)
     return db
 
-def init_db():
-    with get_db() as db:
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS friends (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL
-            );
-            """)
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                friend_id INTEGER NOT NULL REFERENCES friends(id) ON DELETE CASCADE,
-                date DATE NOT NULL,
-                medium TEXT NOT NULL
-            );   
-            """)
-        
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS goals (
-                friend_id INTEGER NOT NULL REFERENCES friends(id) ON DELETE CASCADE,
-                medium TEXT NOT NULL,
-                frequency INT NOT NULL,
-                PRIMARY KEY (friend_id, medium)
-            );   
-            """)
+def transaction():
+    return _immediate(_open())
+
+@contextmanager
+def _immediate(db):
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    db.commit()
+
+SCHEMA_VERSION = 2
+
+MEDIUM_HIERARCHY = """
+    CASE {column}
+        WHEN 'meet' THEN 4
+        WHEN 'call' THEN 3
+        WHEN 'talk' THEN 2
+        WHEN 'text' THEN 1
+        ELSE 0
+    END
+"""
+
+# Contact dates are stored as proleptic Gregorian ordinals (date.toordinal()); this is the julian day of ordinal 0
+ORDINAL_JULIAN_DAY = 1721424.5
+
+ORDINAL_TO_DATE = f"date({{column}} + {ORDINAL_JULIAN_DAY})"
+
+def to_ordinal(text):
+    return date.fromisoformat(text).toordinal()
+
+SCHEMA_TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS friends (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL COLLATE BINARY
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS contacts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        friend_id INTEGER NOT NULL REFERENCES friends(id) ON DELETE CASCADE,
+        date INTEGER NOT NULL,
+        medium TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS goals (
+        friend_id INTEGER NOT NULL REFERENCES friends(id) ON DELETE CASCADE,
+        medium TEXT NOT NULL,
+        frequency INT NOT NULL,
+        PRIMARY KEY (friend_id, medium)
+    );
+    """,
+)
+
+ADD_MEDIUM_RANK_SQL = f"""
+    ALTER TABLE {{table}} ADD COLUMN medium_rank INTEGER
+    GENERATED ALWAYS AS ({MEDIUM_HIERARCHY.format(column = "medium")}) VIRTUAL;
+"""
+
+INVALID_DATE_PREFIX = "invalid:"
+
+LEGACY_DATES_SQL = """
+    SELECT c.id, c.date, c.medium, f.name
+    FROM contacts c JOIN friends f ON f.id = c.friend_id
+"""
+
+SCHEMA_INDEXES_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_contacts_friend_medium_date ON contacts(friend_id, medium, date DESC);",
+    "CREATE INDEX IF NOT EXISTS idx_contacts_friend_rank_date ON contacts(friend_id, medium_rank, date);",
+    "CREATE INDEX IF NOT EXISTS idx_goals_active ON goals(friend_id, medium) WHERE frequency > 0;",
+)
+
+def _has_column(db, table, column):
+    # table_xinfo (unlike table_info) also lists generated columns
+    return any(row["name"] == column for row in db.execute(f"PRAGMA table_xinfo({table})"))
+
+def _legacy_ordinal(value):
+    # Older versions stored --date unchecked. Accept what they would have shown (anything julianday()
+    # read as a date, e.g. with a time part) plus unpadded dates like 2026-1-5
+    text = str(value).strip()
+    try:
+        return date.fromisoformat(text).toordinal()
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).date().toordinal()
+    except ValueError:
+        return datetime.strptime(text, "%Y-%m-%d").date().toordinal()
+
+def _migrate_dates(db):
+    # Before SCHEMA_VERSION 2 contacts.date held whatever was passed to contact --date. The old column had
+    # NUMERIC affinity, so junk like "12" may be an integer; unreadable values are kept as flagged text
+    # (which list skips) rather than left where they could pass for an ordinal
+    from rich import print as rprint
+    updates = []
+    for row in db.execute(LEGACY_DATES_SQL).fetchall():
+        try:
+            updates.append((_legacy_ordinal(row["date"]), row["id"]))
+        except ValueError:
+            flagged = f"{INVALID_DATE_PREFIX}{row['date']}"
+            updates.append((flagged, row["id"]))
+            rprint(f"[yellow]Could not read the date {row['date']!r} of a {row['medium']} with {row['name']}; it was kept as {flagged!r} and list will ignore it[/yellow]")
+    db.executemany("UPDATE contacts SET date = ? WHERE id = ?", updates)
+
+def init_db(db):
+    # Bump SCHEMA_VERSION whenever the DDL above changes so existing databases rerun it
+    if db.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+
+    # The whole upgrade runs under one write lock and commits once. Check again under the lock,
+    # since another process may have upgraded the database after the read above
+    with _immediate(db):
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        for statement in SCHEMA_TABLES_SQL:
+            db.execute(statement)
+        for table in ("contacts", "goals"):
+            if not _has_column(db, table, "medium_rank"):
+                db.execute(ADD_MEDIUM_RANK_SQL.format(table = table))
+        if version < 2:
+            _migrate_dates(db)
+        for statement in SCHEMA_INDEXES_SQL:
+            db.execute(statement)
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+
+FIND_FRIEND_SQL = "SELECT id FROM friends WHERE name = ?"
+
+INSERT_FRIEND_SQL = "INSERT INTO friends (name) VALUES (?)"
 
-app = typer.Typer()
+RENAME_FRIEND_SQL = "UPDATE friends SET name = ? WHERE name = ?"
+
+DELETE_GOAL_SQL = "DELETE FROM goals WHERE friend_id = ? AND medium = ?"
+
+UPSERT_GOAL_SQL = """
+    INSERT INTO goals (friend_id, medium, frequency) VALUES (?, ?, ?)
+    ON CONFLICT (friend_id, medium)
+    DO UPDATE SET frequency = excluded.frequency
+"""
+
+INSERT_CONTACT_SQL = """
+    INSERT INTO contacts (friend_id, medium, date)
+    VALUES (?, ?, ?)
+"""
+
+FRIENDS_PREFIX_SQL = "SELECT name FROM friends WHERE name GLOB ? ORDER BY name"
+
+# (percent overdue, color) pairs checked from the top down; anything below the last threshold is green
+OVERDUE_COLORS = [
+    (100, "red"),
+    (75, "dark_orange"),
+    (50, "gold1"),
+]
+
+OVERDUE_COLOR = (
+    "CASE "
+    + " ".join(f"WHEN percent_overdue >= {threshold} THEN '{color}'" for threshold, color in OVERDUE_COLORS)
+    + " ELSE 'green' END"
+)
+
+ANY_GOALS_SQL = "SELECT EXISTS(SELECT 1 FROM goals WHERE frequency > 0)"
+
+LIST_SQL = f"""
+SELECT
+    name,
+    history,
+    '   Intend to ' || medium || ' every ' || frequency || ' days: ' || CASE
+        WHEN last_valid_contact IS NULL THEN '[red]No contacts logged[/red]'
+        ELSE {ORDINAL_TO_DATE.format(column = "last_valid_contact")} || ' ([' || color || ']' || days_since || ' days ago: '
+            || CAST(percent_overdue AS INTEGER) || '%[/' || color || '])'
+    END AS line
+FROM (
+    SELECT
+        id,
+        name,
+        medium,
+        frequency,
+        days_since,
+        percent_overdue,
+        last_valid_contact,
+        history,
+        MAX(percent_overdue) OVER(PARTITION BY id) as most_overdue,
+        {OVERDUE_COLOR} AS color
+    FROM (
+        SELECT 
+            f.id,
+            f.name, 
+            g.medium,
+            g.frequency,
+            MAX(c.date) AS last_valid_contact,
+            :today - MAX(c.date) AS days_since,
+            100.0 * (:today - MAX(c.date)) / g.frequency as percent_overdue,
+            -- Most recent contact per medium, looked up by friend_id through idx_contacts_friend_medium_date
+            (
+                SELECT GROUP_CONCAT(medium || ': ' || {ORDINAL_TO_DATE.format(column = "most_recent")}, ', ')
+                FROM (
+                    SELECT medium, MAX(date) AS most_recent
+                    FROM contacts
+                    WHERE friend_id = f.id AND typeof(date) = 'integer'
+                    GROUP BY medium
+                    ORDER BY most_recent DESC, ({MEDIUM_HIERARCHY.format(column = "medium")}) DESC
+                )
+            ) AS history
+        FROM friends f JOIN goals g ON f.id = g.friend_id 
+        LEFT JOIN contacts c ON f.id = c.friend_id
+            AND c.medium_rank >= g.medium_rank
+            AND typeof(c.date) = 'integer'
+        WHERE g.frequency > 0
+        GROUP BY f.id, g.medium
+    )
+)
+ORDER BY most_overdue DESC, name, percent_overdue DESC
+"""
+
+@functools.lru_cache(maxsize=256)
+def resolve_friend_id(name):
+    # Cleared by any command that adds or renames friends
+    friend = _open().execute(FIND_FRIEND_SQL, (name,)).fetchone()
+    return friend["id"] if friend else None
+
+def find_friends_prefix(prefix):
+    # GLOB matches case-sensitively like the BINARY name index, so SQLite can range scan it (LIKE could not)
+    pattern = re.sub(r"[*?\[]", lambda match: f"[{match.group()}]", prefix) + "*"
+    return [row["name"] for row in _open().execute(FRIENDS_PREFIX_SQL, (pattern,))]
+
+app = typer.Typer(no_args_is_help = True)
 
 @app.command()
 def add(
     name: str = typer.Argument(..., help = "The friend's full name"), 
     ):
-    with get_db() as db:
+    from rich import print as rprint
+    with transaction() as db:
         cursor = db.cursor()
-        cursor.execute(
-            "INSERT INTO friends (name) VALUES (?)",
-            (name,)
-        )
-        rich.print(f"Added {name}")
+        cursor.execute(INSERT_FRIEND_SQL, (name,))
+        resolve_friend_id.cache_clear()
+        rprint(f"Added {name}")
 
 @app.command()
 def goal(
@@ -77,46 +303,40 @@ def goal(
     medium: Medium = typer.Argument(..., help = "The medium {meet, call, talk, text} that you intend to contact them by"), 
     frequency: int = typer.Argument(..., help = "How frequently in days you want to contact them. Use 0 to remove a goal")
     ):
-    with get_db() as db:
+    from rich import print as rprint
+    if frequency < 0:
+        rprint("[red]Frequency must be a positive number of days, or 0 to remove a goal[/red]")
+        return
+
+    with transaction() as db:
         cursor = db.cursor()
-        friend = db.execute("SELECT * FROM friends WHERE name = ?", (name,)).fetchone()
+        friend_id = resolve_friend_id(name)
 
-        if not friend:
-            rich.print(f"[red]{name} not found in friends[/red]")
+        if friend_id is None:
+            rprint(f"[red]{name} not found in friends[/red]")
             return
         
         if frequency == 0:
-            cursor.execute("DELETE FROM goals WHERE friend_id = ? AND medium = ?",
-                            (friend["id"], medium.value)
-            )
-            rich.print(f"Removed goal to {medium.value} {name}")
+            cursor.execute(DELETE_GOAL_SQL, (friend_id, medium.value))
+            rprint(f"Removed goal to {medium.value} {name}")
         else:
-            cursor.execute("""
-                INSERT INTO goals (friend_id, medium, frequency) VALUES (?, ?, ?)
-                ON CONFLICT (friend_id, medium)
-                DO UPDATE SET frequency = excluded.frequency
-                """,
-                (friend["id"], medium.value, frequency)
-            )
-            rich.print(f"Set goal to {medium.value} {name} every {frequency} days")
+            cursor.execute(UPSERT_GOAL_SQL, (friend_id, medium.value, frequency))
+            rprint(f"Set goal to {medium.value} {name} every {frequency} days")
 
-@app.command
+@app.command()
 def rename(
     name: str = typer.Argument(..., help = "The friend's current full name"),
     new_name: str = typer.Argument(..., help="The updated full name")
     ):
-        with get_db() as db:
-            friend = db.execute("SELECT * FROM friends WHERE name = ?", (name,)).fetchone()
-            if not friend:
-                rich.print(f"[red]{name} not present in friends table[/red]")
+        from rich import print as rprint
+        with transaction() as db:
+            if resolve_friend_id(name) is None:
+                rprint(f"[red]{name} not present in friends table[/red]")
                 return
             
-            db.execute(f"UPDATE friends SET name = ? WHERE name = ?", (new_name, name))
-
-            if new_name:
-                name = new_name
-            result = db.execute("SELECT * FROM friends WHERE name = ?", (name,)).fetchone()
-            rich.print(f"Renamed {name} to {new_name}")
+            db.execute(RENAME_FRIEND_SQL, (new_name, name))
+            resolve_friend_id.cache_clear()
+            rprint(f"Renamed {name} to {new_name}")
 
 @app.command()
 def contact(
@@ -124,106 +344,92 @@ def contact(
     medium: Medium = typer.Argument(..., help = "The medium {meet, call, talk, text} that you contacted them by"), 
     date: str = typer.Option(default = str(date.today()), help = "The date you contacted them in YYYY-MM-DD (defaults to current date)")
     ):
-        with get_db() as db:
+        from rich import print as rprint
+        try:
+            day = to_ordinal(date)
+        except ValueError:
+            rprint(f"[red]{date} is not a date in YYYY-MM-DD[/red]")
+            return
+
+        with transaction() as db:
+            friend_id = resolve_friend_id(name)
+            if friend_id is None:
+                rprint(f"[red]{name} not found in friends[/red]")
+                return
+
             cursor = db.cursor()
-            cursor.execute(
-                """INSERT INTO contacts (friend_id, medium, date) 
-                VALUES ( 
-                    (
-                        SELECT id FROM friends WHERE name = ?
-                    ), 
-                    ?, ?)""",
-                (name, medium, date)
+            cursor.execute(INSERT_CONTACT_SQL, (friend_id, medium, day))
+            rprint(f"{past_tense[medium.value].capitalize()} with {name} on {date}")
+
+@app.command()
+def contact_bulk(
+    file: typer.FileText = typer.Argument(..., help = "A CSV of name,medium[,date] rows to log as contacts, or - to read stdin")
+    ):
+        from rich import print as rprint
+        today = date.today().toordinal()
+        contacts = []
+        for line, record in enumerate(csv.reader(file), start = 1):
+            record = [field.strip() for field in record]
+            if not any(record):
+                continue
+            if len(record) not in (2, 3) or record[1] not in Medium.__members__:
+                rprint(f"[red]Line {line} is not name,medium[,date] with a medium in {{meet, call, talk, text}}[/red]")
+                return
+            name, medium, *contact_date = record
+            try:
+                day = to_ordinal(contact_date[0]) if contact_date else today
+            except ValueError:
+                rprint(f"[red]Line {line} has {contact_date[0]}, which is not a date in YYYY-MM-DD[/red]")
+                return
+            contacts.append((name, medium, day))
+
+        with transaction() as db:
+            missing = sorted({name for name, _, _ in contacts if resolve_friend_id(name) is None})
+            if missing:
+                rprint(f"[red]{', '.join(missing)} not found in friends[/red]")
+                return
+
+            db.executemany(
+                INSERT_CONTACT_SQL,
+                ((resolve_friend_id(name), medium, day) for name, medium, day in contacts)
             )
-            rich.print(f"{past_tense[medium.value].capitalize()} with {name} on {date}")
+            rprint(f"Logged {len(contacts)} contacts")
 
 @app.command()
 def list():
-    medium_hierarchy = """
-        CASE {column}
-            WHEN 'meet' THEN 4
-            WHEN 'call' THEN 3
-            WHEN 'talk' THEN 2
-            WHEN 'text' THEN 1
-            ELSE 0
-        END
-    """
+    from rich.console import Console
+    db = _open()
+    if not db.execute(ANY_GOALS_SQL).fetchone()[0]:
+        typer.echo("Friends list is empty")
+        return
 
-    query = f"""
-    SELECT
-        name,
-        medium,
-        frequency,
-        days_since,
-        percent_overdue,
-        last_valid_contact,
-        MAX(percent_overdue) OVER(PARTITION BY id) as most_overdue
-    FROM (
-        SELECT 
-            f.id,
-            f.name, 
-            g.medium,
-            g.frequency,
-            MAX(c.date) AS last_valid_contact,
-            CAST((julianday('now', 'localtime') - julianday(MAX(c.date))) AS INTEGER) AS days_since,
-            100.0 * CAST((julianday('now', 'localtime') - julianday(MAX(c.date))) AS INTEGER) / g.frequency as percent_overdue
-        FROM friends f JOIN goals g ON f.id = g.friend_id 
-        LEFT JOIN contacts c ON f.id = c.friend_id
-            AND ({medium_hierarchy.format(column = "c.medium")}) >= ({medium_hierarchy.format(column = "g.medium")})
-        GROUP BY f.id, g.medium
-    )
-    ORDER BY most_overdue DESC, name, percent_overdue DESC
-    """
+    today = date.today().toordinal()
+    # Plain tuples streamed in chunks rather than a fully fetched list of sqlite3.Row
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.arraysize = 256
+    cursor.execute(LIST_SQL, {"today": today})
     
-    with get_db() as db:
-        rows = db.execute(query).fetchall()
+    prev_name = ""
+    medium_history = None
+    console = Console()
+    
+    # The console buffers everything printed inside the with block and writes it once on exit
+    with console:
+        for chunk in iter(cursor.fetchmany, []):
+            for name, history, line in chunk:
+                if prev_name != name:
+                    if prev_name != "":
+                        if medium_history:
+                            console.print(f"   [dim]{medium_history}[/dim]")
+                        console.print()
+                    prev_name = name
+                    medium_history = history
+                    console.print(f"[bold]{name}[/bold]")
 
-        if not rows:
-            typer.echo("Friends list is empty")
-            return
-        
-        prev_name = ""
-        medium_history = ""
-        
-        for row in rows:
-            if prev_name != row["name"]:
-                if prev_name != "":
-                    print_history(prev_name, db)
-                    print()
-                prev_name = row["name"]
-                rich.print(f"[bold]{row["name"]}[/bold]")
-
-            days = int(row["days_since"]) if row["days_since"] is not None else 0
-            percent = int(row["percent_overdue"]) if row["percent_overdue"] is not None else 100
-            if row["last_valid_contact"] is None:
-                last_contact_string = "[red]No contacts logged[/red]"
-            else:
-                if (percent >= 100):
-                    format = "red"
-                elif (percent >= 75):
-                    format = "dark_orange"
-                elif (percent >= 50):
-                    format = "gold1"
-                else:
-                    format = "green"
-                last_contact_string = f"{row['last_valid_contact']} ([{format}]{days} days ago: {percent}%[/{format}])"
-            
-            rich.print(f"   Intend to {row["medium"]} every {row["frequency"]} days: {last_contact_string}")
-        print_history(prev_name, db)  
-
-def print_history(name, db):
-    medium_history = db.execute("""
-                        SELECT GROUP_CONCAT(recents.medium || ": " || recents.most_recent, ", ")
-                        FROM (
-                            SELECT medium, MAX(date) as most_recent
-                            FROM contacts
-                            WHERE friend_id = (SELECT id FROM friends WHERE name = ?)
-                            GROUP BY medium
-                            ORDER BY date DESC
-                        ) AS recents
-                        """, (name,)).fetchone()[0]
-    if medium_history:
-        rich.print(f"   [dim]{medium_history}[/dim]")   
-
-init_db()
-app()
\ No newline at end of file
+                console.print(line)
+        if medium_history:
+            console.print(f"   [dim]{medium_history}[/dim]")
+
+if __name__ == "__main__":
+    app()
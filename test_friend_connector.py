@@ -0,0 +1,70 @@
+import sqlite3
+from datetime import date
+
+import friend_connector
+
+# The schema as it was before user_version was tracked, with dates stored as whatever --date was given
+BASELINE_SCHEMA = """
+    CREATE TABLE friends (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL
+    );
+    CREATE TABLE contacts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        friend_id INTEGER NOT NULL REFERENCES friends(id) ON DELETE CASCADE,
+        date DATE NOT NULL,
+        medium TEXT NOT NULL
+    );
+    CREATE TABLE goals (
+        friend_id INTEGER NOT NULL REFERENCES friends(id) ON DELETE CASCADE,
+        medium TEXT NOT NULL,
+        frequency INT NOT NULL,
+        PRIMARY KEY (friend_id, medium)
+    );
+"""
+
+def open_baseline_db(tmp_path, contacts):
+    db = sqlite3.connect(tmp_path / "friends.db", isolation_level=None)
+    db.row_factory = sqlite3.Row
+    db.executescript(BASELINE_SCHEMA)
+    db.execute("INSERT INTO friends (name) VALUES ('Bob')")
+    db.execute("INSERT INTO goals (friend_id, medium, frequency) VALUES (1, 'text', 7)")
+    db.executemany("INSERT INTO contacts (friend_id, medium, date) VALUES (1, ?, ?)", contacts)
+    return db
+
+def stored_dates(db):
+    return [row["date"] for row in db.execute("SELECT date FROM contacts ORDER BY id")]
+
+def test_upgrade_converts_legacy_dates(tmp_path):
+    db = open_baseline_db(tmp_path, [
+        ("meet", "2026-01-05"),
+        ("call", "2026-1-5"),
+        ("talk", "2026-10-05 10:00:00"),
+        ("text", "20260105"),
+    ])
+    friend_connector.init_db(db)
+
+    jan_5 = date(2026, 1, 5).toordinal()
+    assert stored_dates(db) == [jan_5, jan_5, date(2026, 10, 5).toordinal(), jan_5]
+    assert db.execute("PRAGMA user_version").fetchone()[0] == friend_connector.SCHEMA_VERSION
+
+def test_upgrade_flags_unreadable_dates_and_list_ignores_them(tmp_path):
+    # "12" lands as the integer 12 under the old column's NUMERIC affinity
+    db = open_baseline_db(tmp_path, [("call", "12"), ("text", "yesterday"), ("meet", "2026-01-05")])
+    friend_connector.init_db(db)
+
+    assert stored_dates(db) == ["invalid:12", "invalid:yesterday", date(2026, 1, 5).toordinal()]
+
+    today = date(2026, 1, 12).toordinal()
+    rows = db.execute(friend_connector.LIST_SQL, {"today": today}).fetchall()
+    assert [(row["history"], row["line"]) for row in rows] == [
+        ("meet: 2026-01-05", "   Intend to text every 7 days: 2026-01-05 ([red]7 days ago: 100%[/red])"),
+    ]
+
+def test_upgrade_runs_once(tmp_path):
+    db = open_baseline_db(tmp_path, [("call", "2026-01-05")])
+    friend_connector.init_db(db)
+    db.execute("INSERT INTO contacts (friend_id, medium, date) VALUES (1, 'text', 740000)")
+    friend_connector.init_db(db)
+
+    assert stored_dates(db) == [date(2026, 1, 5).toordinal(), 740000]